@@ -0,0 +1,110 @@
+"""Headless batch report over a directory of per-person trip CSVs, computed in parallel across cores.
+
+Run from the repository root:
+
+    python -m absence_batch trips/ --output report.parquet
+
+Every CSV is read exactly like an uploaded file in the app (`absence_core.read_trips_csv`) and may hold
+one person or several (via a Traveler column). The report has one row per traveler per file; a `.parquet`
+output path writes Parquet, anything else writes CSV.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from absence_core import (
+    ALLOWANCE_DAYS, DATE_FORMAT, read_trips_csv, compute_tracker, day_ordinals, upcoming_restorations,
+)
+
+COUNT_COLUMNS = ("trips", "days_abroad_last_365", "allowance_today", "breach_days", "inferred_dates")
+
+def traveler_summaries(tracker, next_restorations=3):
+    """One summary dict per traveler: today's allowance, rolling-window breaches and next restorations."""
+    today_index = day_ordinals(np.datetime64(tracker["today"])) - tracker["span_start"]
+    rolling = tracker["rolling"]
+    over = rolling > ALLOWANCE_DAYS
+    restoration = tracker["restoration"]
+    summaries = []
+    for code, traveler in enumerate(tracker["travelers"]):
+        selected = tracker["codes"] == code
+        used = int(rolling[code, today_index]) if 0 <= today_index < rolling.shape[1] else 0
+        breaches = np.flatnonzero(over[code])
+        summary = {
+            "traveler": traveler,
+            "trips": int(selected.sum()),
+            "days_abroad_last_365": used,
+            "allowance_today": ALLOWANCE_DAYS - used,
+            "breach_days": len(breaches),
+            "first_breach": (pd.Timestamp(np.datetime64(int(tracker["span_start"] + breaches[0]), 'D'))
+                             if len(breaches) else pd.NaT),
+        }
+        nearest = upcoming_restorations(restoration[selected], tracker["today"], next_restorations)
+        for i in range(next_restorations):
+            has_row = i < len(nearest)
+            summary[f"restoration_{i + 1}_date"] = nearest['Date'].iloc[i] if has_row else pd.NaT
+            summary[f"restoration_{i + 1}_days"] = nearest['Restored'].iloc[i] if has_row else np.nan
+        summaries.append(summary)
+    return summaries
+
+def summarize_file(path, today, next_restorations=3, date_format=DATE_FORMAT):
+    """Worker entry point: summaries for every traveler in one CSV, or a single row carrying the error.
+
+    `inferred_dates` counts the file's dates that did not match `date_format`.
+    """
+    try:
+        trips, date_fallback = read_trips_csv(path, date_format)
+        tracker = compute_tracker(trips, today)
+        summaries = traveler_summaries(tracker, next_restorations)
+    except Exception as e:
+        return [{"file": os.path.basename(path), "error": f"{type(e).__name__}: {e}"}]
+    return [{"file": os.path.basename(path), **summary, "inferred_dates": len(date_fallback), "error": None}
+            for summary in summaries]
+
+def batch_report(paths, today, next_restorations=3, workers=None, chunksize=8, date_format=DATE_FORMAT):
+    """Summarize `paths` on a process pool (`workers` processes, default one per core) into one frame."""
+    worker = partial(summarize_file, today=today, next_restorations=next_restorations, date_format=date_format)
+    if workers == 1:
+        return report_frame(map(worker, paths))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return report_frame(pool.map(worker, paths, chunksize=chunksize))
+
+def report_frame(results):
+    report = pd.DataFrame([row for rows in results for row in rows])
+    if "error" not in report:
+        return report
+    counts = [c for c in report if c in COUNT_COLUMNS or (c.startswith("restoration_") and c.endswith("_days"))]
+    report[counts] = report[counts].astype("Int64")
+    return report[[c for c in report if c != "error"] + ["error"]]
+
+def write_report(report, output):
+    if Path(output).suffix == ".parquet":
+        report.to_parquet(output, index=False)
+    else:
+        report.to_csv(output, index=False, date_format="%Y-%m-%d")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="directory scanned (non-recursively) for *.csv trip files")
+    parser.add_argument("--output", default="absence_report.csv", help="report path; .parquet writes Parquet")
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today(), help="YYYY-MM-DD, default today")
+    parser.add_argument("--next", type=int, default=3, dest="next_restorations", help="upcoming restorations per traveler")
+    parser.add_argument("--date-format", default=DATE_FORMAT, help="strptime format tried first for every date")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default one per core")
+    parser.add_argument("--chunksize", type=int, default=8, help="files handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    paths = sorted(str(p) for p in Path(args.directory).glob("*.csv"))
+    report = batch_report(paths, args.today, args.next_restorations, args.workers, args.chunksize,
+                          args.date_format)
+    write_report(report, args.output)
+    failed = report["error"].notna().sum() if "error" in report else 0
+    print(f"Wrote {len(report)} rows from {len(paths)} files to {args.output} ({failed} failed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""Streamlit-free core of the UK Absence Tracker: trip parsing, rolling allowances, calendar events
+and restoration dates. Everything here takes and returns plain arrays and DataFrames."""
+import hashlib
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from absence_profiling import profile_stage
+
+TRAVELER_COLUMN = "Traveler"
+
+# === Trip Parsing ===
+DATE_FORMAT = "%d/%m/%Y"
+DATE_COLUMNS = ("Departure", "Return")
+SHEETS_EPOCH = np.datetime64("1899-12-30", "D")
+
+def serial_dates(serials):
+    """Google Sheets day serial numbers (days since 1899-12-30, time of day as the fraction) as dates."""
+    days = np.floor(np.asarray(serials, dtype=np.float64)).astype(np.int64)
+    return SHEETS_EPOCH + days.astype("timedelta64[D]")
+
+def parse_dates(values, date_format=DATE_FORMAT, serials=False):
+    """Parse `values` with `date_format` in one vectorized pass; only non-blank values that don't match
+    fall back to ISO 8601, then day-first inference. Returns the dates and a mask of the fallback values.
+
+    With `serials`, numbers (unformatted Sheets date cells) are converted directly and never count as
+    fallback; only text cells go through string parsing.
+    """
+    if serials:
+        numbers = pd.to_numeric(values, errors="coerce")
+        serial = numbers.notna().to_numpy()
+        if serial.any():
+            parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[s]")
+            parsed[serial] = serial_dates(numbers[serial])
+            retry = np.zeros(len(values), dtype=bool)
+            if not serial.all():
+                parsed[~serial], retry[~serial] = parse_dates(values[~serial], date_format)
+            return parsed, retry
+    parsed = pd.to_datetime(values, format=date_format, errors="coerce")
+    retry = (parsed.isna() & values.notna()).to_numpy(copy=True)
+    retry[retry] = values[retry].astype(str).str.strip().ne("").to_numpy()
+    if retry.any():
+        inferred = pd.to_datetime(values[retry], format="ISO8601", errors="coerce")
+        missing = inferred.isna()
+        inferred[missing] = pd.to_datetime(values[retry][missing], format="mixed", dayfirst=True, errors="coerce")
+        parsed[retry] = inferred
+    return parsed, retry
+
+def parse_trip_dates(df, date_format=DATE_FORMAT, serials=False):
+    """Parse the date columns of `df` in place and return the rows that did not match `date_format`.
+
+    `Row` counts like the sheet or file does (header on row 1); `Parsed` is NaT where inference failed too.
+    """
+    fallback = []
+    for column in DATE_COLUMNS:
+        raw = df[column]
+        df[column], retry = parse_dates(raw, date_format, serials)
+        fallback.append(pd.DataFrame({"Row": df.index[retry] + 2, "Column": column,
+                                      "Value": raw[retry].astype(str), "Parsed": df[column][retry]}))
+    return pd.concat(fallback, ignore_index=True).sort_values("Row", kind="stable", ignore_index=True)
+
+def text_travelers(df):
+    """Store Traveler names as text in place; unformatted sheet reads return numeric names as numbers."""
+    if TRAVELER_COLUMN in df.columns:
+        df[TRAVELER_COLUMN] = df[TRAVELER_COLUMN].fillna("").astype(str)
+
+def read_trips_csv(source, date_format=DATE_FORMAT):
+    """Trips from a CSV file, plus the `parse_trip_dates` report of dates that needed the fallback."""
+    df = pd.read_csv(source, dtype={column: str for column in DATE_COLUMNS})
+    text_travelers(df)
+    return df, parse_trip_dates(df, date_format)
+
+def trips_frame(header, rows, date_format=DATE_FORMAT, first_row=0, serials=False):
+    """Trips from worksheet values (`first_row` is the index of `rows[0]` among all data rows).
+
+    Pass `serials=True` for values fetched unformatted, where date cells arrive as day serial numbers.
+    """
+    width = len(header)
+    df = pd.DataFrame([row + [''] * (width - len(row)) for row in rows], columns=header)
+    df.index += first_row
+    text_travelers(df)
+    return df, parse_trip_dates(df, date_format, serials)
+
+def trip_columns(header):
+    """The header names the trips frame needs: the date columns and, if present, Traveler."""
+    return [name for name in header if name in DATE_COLUMNS or name == TRAVELER_COLUMN]
+
+def columns_frame(columns, date_format=DATE_FORMAT, first_row=0, serials=False):
+    """Trips from column-major worksheet values, {header: values}; shorter columns are padded with ''."""
+    length = max(map(len, columns.values()), default=0)
+    df = pd.DataFrame({name: list(values) + [''] * (length - len(values)) for name, values in columns.items()})
+    df.index += first_row
+    text_travelers(df)
+    return df, parse_trip_dates(df, date_format, serials)
+
+def traveler_codes(trips, travelers=()):
+    """Integer traveler index per trip, plus the traveler names (`travelers` first, new names appended).
+
+    Sheets without a Traveler column, or without any trips, are treated as a single traveler named "".
+    """
+    travelers = list(travelers)
+    if TRAVELER_COLUMN not in trips.columns:
+        return np.zeros(len(trips), dtype=np.int64), travelers or [""]
+    names = trips[TRAVELER_COLUMN].fillna("").astype(str).str.strip()
+    index = {name: i for i, name in enumerate(travelers)}
+    for name in pd.unique(names):
+        if name not in index:
+            index[name] = len(travelers)
+            travelers.append(name)
+    return names.map(index).to_numpy(np.int64), travelers or [""]
+
+def trips_digest(trips):
+    """Stable content hash of the columns every derived result depends on: Departure, Return and Traveler."""
+    columns = [column for column in (*DATE_COLUMNS, TRAVELER_COLUMN) if column in trips.columns]
+    key = trips[columns].astype({column: "datetime64[s]" for column in DATE_COLUMNS})
+    digest = hashlib.blake2b(",".join(columns).encode(), digest_size=16)
+    digest.update(pd.util.hash_pandas_object(key, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def trip_lengths(trips):
+    """Number of full days abroad per trip: the days strictly between departure and return."""
+    return (trips['Return'] - trips['Departure']).dt.days - 1
+
+# === Rolling 12-Month Absence Engine ===
+# Every per-day array is 2-D, one row per traveler, so all travelers are computed in the same pass.
+ALLOWANCE_DAYS = 180
+WINDOW_DAYS = 365
+RESTORATIONS_SHOWN = 10
+
+def day_ordinals(values):
+    return np.asarray(values).astype('datetime64[D]').astype(np.int64)
+
+def abroad_bitmap(trips, start, end, codes=None, travelers=1):
+    """(travelers, days) 0/1 array over day ordinals start..end marking full days abroad.
+
+    Overlapping trips of the same traveler count once.
+    """
+    span = end - start + 1
+    codes = np.zeros(len(trips), dtype=np.int64) if codes is None else np.asarray(codes)
+    valid = (trips['Departure'].notna() & trips['Return'].notna()).to_numpy()
+    first = np.clip(day_ordinals(trips['Departure'][valid]) + 1 - start, 0, span)
+    stop = np.clip(day_ordinals(trips['Return'][valid]) - start, 0, span)
+    keep = stop > first
+    row_offsets = codes[valid][keep] * (span + 1)
+    size = travelers * (span + 1)
+    edges = (np.bincount(row_offsets + first[keep], minlength=size)
+             - np.bincount(row_offsets + stop[keep], minlength=size)).reshape(travelers, span + 1)
+    return (np.cumsum(edges[:, :-1], axis=1) > 0).astype(np.int8)
+
+def rolling_abroad_counts(bitmap, window=WINDOW_DAYS):
+    """Days abroad in the `window` days ending on each day, via one prefix sum along the last axis."""
+    rolling = np.empty(bitmap.shape, dtype=np.int64)
+    refresh_rolling_counts(rolling, bitmap, 0, window)
+    return rolling
+
+def refresh_rolling_counts(rolling, bitmap, from_index, window=WINDOW_DAYS):
+    """Recompute `rolling` in place from day `from_index` on, after the bitmap changed only there."""
+    lo = max(from_index - window, 0)
+    prefix = np.cumsum(bitmap[..., lo:], axis=-1, dtype=np.int64)
+    prefix = np.concatenate((np.zeros(prefix.shape[:-1] + (1,), dtype=np.int64), prefix), axis=-1)
+    ends = np.arange(from_index - lo + 1, prefix.shape[-1])
+    rolling[..., from_index:] = prefix[..., ends] - prefix[..., np.maximum(ends - window, 0)]
+
+def trip_allowances(rolling, span_start, returns, codes=None):
+    has_return = returns.notna().to_numpy()
+    codes = np.zeros(len(returns), dtype=np.int64) if codes is None else np.asarray(codes)
+    return_index = day_ordinals(returns[has_return]) - span_start
+    return pd.Series(ALLOWANCE_DAYS - rolling[codes[has_return], return_index], index=returns.index[has_return])
+
+# === Calendar Events ===
+def balance_runs(remaining_by_day):
+    """Start index of each run of consecutive days sharing the same remaining balance."""
+    if len(remaining_by_day) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, remaining_by_day[1:] != remaining_by_day[:-1]])
+
+def build_daily_events(dates, remaining_by_day, run_starts):
+    # One background event per run of equal balances; FullCalendar treats the all-day end as exclusive.
+    if len(run_starts) == 0:
+        return []
+    run_ends = np.append(run_starts[1:], len(dates))
+    starts = dates[run_starts].strftime("%Y-%m-%d")
+    ends = (dates[run_ends - 1] + timedelta(days=1)).strftime("%Y-%m-%d")
+    return [
+        {
+            "id": f"balance-{start}",
+            "title": f"📉 {remaining} days left",
+            "start": start,
+            "end": end,
+            "allDay": True,
+            "display": "background",
+            "backgroundColor": "#f0f9ff"
+        }
+        for start, end, remaining in zip(starts, ends, remaining_by_day[run_starts].tolist())
+    ]
+
+def build_trip_events(df):
+    events = []
+    for i, row in df.iterrows():
+        if pd.isnull(row['Departure']) or pd.isnull(row['Return']):
+            continue
+        events.append({
+            "id": str(i),
+            "title": f"{row['Departure'].date()} - {row['Return'].date()}",
+            "start": row['Departure'].strftime("%Y-%m-%d"),
+            "end": (row['Return'] + timedelta(days=1)).strftime("%Y-%m-%d"),
+            "color": "#dc3545",
+            "allDay": True,
+            "extendedProps": {
+                "length": f"{(row['Return'] - row['Departure']).days} days",
+                "type": "Abroad",
+                "allowance": row['Allowance']
+            }
+        })
+    return events
+
+def balance_today(rolling, span_start, today):
+    """Each traveler's remaining allowance on `today`, from the rolling window."""
+    today_index = day_ordinals(np.datetime64(today, 'D')) - span_start
+    if not 0 <= today_index < rolling.shape[-1]:
+        return np.full(rolling.shape[:-1], ALLOWANCE_DAYS, dtype=np.int64)
+    return ALLOWANCE_DAYS - rolling[..., today_index]
+
+def restoration_schedule(df, today, rolling, span_start, codes=None):
+    """Every trip's restoration as of `today`, for all travelers at once.
+
+    A day abroad leaves the rolling window 365 days later, so each trip gives back the full days abroad
+    it still has inside today's window (days shared with an earlier overlapping trip count once, as in
+    the bitmap) on the day the last of them leaves the window. `New Balance` starts from each traveler's
+    balance today and adds the restorations in date order; trips with nothing left to restore have a
+    NaT `Date`.
+    """
+    codes = np.zeros(len(df), dtype=np.int64) if codes is None else np.asarray(codes)
+    today_day = day_ordinals(np.datetime64(today, 'D'))
+    valid = (df['Departure'].notna() & df['Return'].notna()).to_numpy()
+    first = np.where(valid, day_ordinals(df['Departure']) + 1, 0)
+    last = np.where(valid, day_ordinals(df['Return']) - 1, np.iinfo(np.int64).min // 2)
+    # Rows are sorted by departure, so a traveler's earlier trips cover up to their running max last day.
+    covered = pd.Series(last).groupby(codes).cummax().groupby(codes).shift(1, fill_value=np.iinfo(np.int64).min // 2)
+    lo = np.maximum.reduce([first, covered.to_numpy() + 1, np.full(len(df), today_day - WINDOW_DAYS + 1)])
+    hi = np.minimum(last, today_day)
+    restored = np.where(valid, np.maximum(hi - lo + 1, 0), 0)
+    restoring = np.flatnonzero(restored > 0)
+    dates = np.full(len(df), np.datetime64("NaT"), dtype="datetime64[D]")
+    dates[restoring] = (hi[restoring] + WINDOW_DAYS).astype("datetime64[D]")
+
+    new_balance = np.full(len(df), np.nan)
+    order = restoring[np.lexsort((restoring, dates[restoring], codes[restoring]))]
+    cumulative = pd.Series(restored[order]).groupby(codes[order]).cumsum().to_numpy()
+    new_balance[order] = balance_today(rolling, span_start, today)[codes[order]] + cumulative
+    return pd.DataFrame({
+        "Date": pd.to_datetime(dates),
+        "Restored": restored,
+        "New Balance": pd.array(new_balance, dtype="Int64"),
+    }, index=df.index)
+
+def upcoming_restorations(restoration, today, n=RESTORATIONS_SHOWN):
+    """The `n` earliest restorations dated after `today`, in date order.
+
+    Uses a partial sort (argpartition) so the cost stays linear in the number of trips; ties keep
+    schedule order.
+    """
+    days = day_ordinals(restoration['Date'])
+    after = np.flatnonzero(restoration['Date'].notna().to_numpy() & (days > day_ordinals(np.datetime64(today, 'D'))))
+    key = days[after] * len(restoration) + after
+    if len(after) > n > 0:
+        nearest = np.argpartition(key, n - 1)[:n]
+        after, key = after[nearest], key[nearest]
+    return restoration.iloc[after[np.argsort(key)][:n]]
+
+# === Derived Results ===
+def compute_tracker(trips, today, profiler=None):
+    """Run the grouped pipeline for every traveler and return the shared arrays in one dict.
+
+    Per-traveler tables and calendar events are sliced out afterwards by `traveler_view`.
+    `profiler` is an optional absence_profiling.StageProfiler that times each section.
+    """
+    with profile_stage(profiler, "sort"):
+        df = trips.sort_values("Departure", kind="stable").reset_index(drop=True)
+
+    with profile_stage(profiler, "length"):
+        df['Length'] = trip_lengths(df)
+
+    with profile_stage(profiler, "allowance"):
+        codes, travelers = traveler_codes(df)
+        end_future = today + timedelta(days=365)
+        # With no readable dates at all the span starts today, leaving every balance at the full allowance.
+        span_start = day_ordinals(df['Departure'].min() if df['Departure'].notna().any() else today)
+        span_end = day_ordinals(end_future)
+        if df['Return'].notna().any():
+            span_end = max(span_end, day_ordinals(df['Return'].max()))
+        bitmap = abroad_bitmap(df, span_start, span_end, codes, len(travelers))
+        rolling = rolling_abroad_counts(bitmap)
+        df['Allowance'] = trip_allowances(rolling, span_start, df['Return'], codes)
+
+    with profile_stage(profiler, "restoration"):
+        restoration = restoration_schedule(df, today, rolling, span_start, codes)
+
+    return {
+        "today": today,
+        "rows": len(trips),
+        "df": df,
+        "codes": codes,
+        "travelers": travelers,
+        "span_start": span_start,
+        "bitmap": bitmap,
+        "rolling": rolling,
+        "restoration": restoration,
+    }
+
+def extend_tracker(base, appended, today, profiler=None):
+    """Fold trips appended after `base` was computed into its results, touching only the affected tail.
+
+    Returns None when the new trips would not sort after every existing one, so the caller falls back
+    to a full recompute.
+    """
+    old_df = base["df"]
+    appended = appended.sort_values("Departure", kind="stable")
+    if (appended.empty or old_df.empty or appended['Departure'].isna().any() or old_df['Departure'].isna().any()
+            or appended['Departure'].min() < old_df['Departure'].max()):
+        return None
+
+    with profile_stage(profiler, "process data"):
+        df = pd.concat([old_df.drop(columns='Allowance'), appended], ignore_index=True)
+        df['Length'] = trip_lengths(df)
+        new = df.iloc[len(old_df):]
+        new_codes, travelers = traveler_codes(new, base["travelers"])
+        codes = np.concatenate((base["codes"], new_codes))
+
+        span_start = base["span_start"]
+        span_end = day_ordinals(today + timedelta(days=365))
+        if df['Return'].notna().any():
+            span_end = max(span_end, day_ordinals(df['Return'].max()))
+        old_travelers, old_span = base["bitmap"].shape
+        grow = ((0, len(travelers) - old_travelers), (0, max(span_end - span_start + 1 - old_span, 0)))
+        bitmap = np.pad(base["bitmap"], grow)
+        bitmap |= abroad_bitmap(new, span_start, span_start + bitmap.shape[1] - 1, new_codes, len(travelers))
+        rolling = np.pad(base["rolling"], grow)
+        first_changed = min(day_ordinals(new['Departure'].min()) + 1 - span_start, old_span)
+        refresh_rolling_counts(rolling, bitmap, first_changed)
+        df['Allowance'] = trip_allowances(rolling, span_start, df['Return'], codes)
+
+    with profile_stage(profiler, "restoration"):
+        restoration = restoration_schedule(df, today, rolling, span_start, codes)
+
+    return {
+        "today": today,
+        "rows": base["rows"] + len(appended),
+        "df": df,
+        "codes": codes,
+        "travelers": travelers,
+        "span_start": span_start,
+        "bitmap": bitmap,
+        "rolling": rolling,
+        "restoration": restoration,
+    }
+
+def roll_tracker_forward(base, today):
+    """`base` moved on to a later `today` without recomputing it.
+
+    Only the balance arrays and the restorations depend on the date: the arrays are extended to the new
+    one-year horizon with rolling counts filled in for the added days, and the restorations are redone
+    from them. Trips and allowances are reused.
+    Returns None if `today` is earlier than the date `base` was built for.
+    """
+    if today < base["today"]:
+        return None
+    span_start = base["span_start"]
+    old_span = base["bitmap"].shape[1]
+    grow = max(day_ordinals(today + timedelta(days=365)) - span_start + 1 - old_span, 0)
+    bitmap, rolling = base["bitmap"], base["rolling"]
+    if grow:
+        bitmap = np.pad(bitmap, ((0, 0), (0, grow)))
+        rolling = np.pad(rolling, ((0, 0), (0, grow)))
+        refresh_rolling_counts(rolling, bitmap, old_span)
+    restoration = restoration_schedule(base["df"], today, rolling, span_start, base["codes"])
+    return {**base, "today": today, "bitmap": bitmap, "rolling": rolling, "restoration": restoration}
+
+def traveler_trips(tracker, traveler, profiler=None):
+    """The date-independent part of a traveler's view: their trips and the trips' calendar events."""
+    selected = tracker["codes"] == tracker["travelers"].index(traveler)
+    df = tracker["df"][selected]
+    with profile_stage(profiler, "main events"):
+        events = build_trip_events(df)
+    return {"selected": selected, "df": df, "events": events}
+
+def traveler_view(tracker, traveler, profiler=None, restorations=RESTORATIONS_SHOWN, trips=None):
+    """One traveler's trip table, next `restorations` balance increases and calendar events, sliced from
+    grouped results. `trips` is their `traveler_trips`, reused across dates when given."""
+    if trips is None:
+        trips = traveler_trips(tracker, traveler, profiler)
+    code = tracker["travelers"].index(traveler)
+    df = trips["df"]
+    restoration_df = upcoming_restorations(tracker["restoration"][trips["selected"]], tracker["today"], restorations)
+    daily_events = []
+    with profile_stage(profiler, "daily tracker"):
+        if df['Departure'].notna().any():
+            all_dates = pd.date_range(df['Departure'].min(), tracker["today"] + timedelta(days=365))
+            offset = day_ordinals(df['Departure'].min()) - tracker["span_start"]
+            remaining_by_day = np.maximum(ALLOWANCE_DAYS - tracker["rolling"][code, offset:offset + len(all_dates)], 0)
+            daily_events = build_daily_events(all_dates, remaining_by_day, balance_runs(remaining_by_day))
+
+    return {"df": df, "restoration_df": restoration_df, "daily_events": daily_events, "events": trips["events"]}
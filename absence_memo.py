@@ -0,0 +1,49 @@
+"""Bounded least-recently-used memo for derived results, with hit/miss counters."""
+import threading
+from collections import Counter, OrderedDict
+
+_MISSING = object()
+
+class LRUMemo:
+    """Thread-safe LRU mapping holding at most `max_entries` values.
+
+    Keys are tuples whose first item names the kind of result (e.g. "tracker", "view"); hits and
+    misses are counted per kind. Values are computed outside the lock, so two threads missing the
+    same key at once may both compute it; the later one wins.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses[key[0]] += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits[key[0]] += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "max_entries": self.max_entries,
+                    "hits": dict(self.hits), "misses": dict(self.misses)}
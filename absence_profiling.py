@@ -0,0 +1,65 @@
+"""Per-stage wall time, CPU time and peak memory measurement shared by the app and the benchmarks."""
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# tracemalloc is process-wide and slows every allocation down, so it runs only while at least one stage
+# is measuring memory, across all threads, and is stopped when the last one ends.
+_tracing_lock = threading.Lock()
+_tracing_stages = 0
+_started_tracing = False
+
+def _start_tracing():
+    global _tracing_stages, _started_tracing
+    with _tracing_lock:
+        if _tracing_stages == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_stages += 1
+
+def _stop_tracing():
+    global _tracing_stages, _started_tracing
+    with _tracing_lock:
+        _tracing_stages -= 1
+        if _tracing_stages == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+class StageProfiler:
+    """Collects one record per `stage(...)` block: wall seconds, CPU seconds and tracemalloc peak bytes.
+
+    Stages are meant to run one after another; nesting them resets the outer stage's memory peak.
+    Tracing is shared by every stage in the process, so peaks (and CPU time) are only accurate while a
+    single profiling session runs; concurrent ones reset and add to each other's figures.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, **extra):
+        if self.trace_memory:
+            _start_tracing()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "stage": name,
+                "wall_s": time.perf_counter() - wall,
+                "cpu_s": time.process_time() - cpu,
+                "peak_bytes": None,
+                **extra,
+            }
+            if self.trace_memory:
+                record["peak_bytes"] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+                _stop_tracing()
+            self.records.append(record)
+
+def profile_stage(profiler, name, **extra):
+    """`profiler.stage(name)`, or a no-op when profiling is off (`profiler` is None)."""
+    return profiler.stage(name, **extra) if profiler is not None else nullcontext()
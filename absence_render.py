@@ -0,0 +1,97 @@
+"""HTML and table rendering for the UK Absence Tracker, kept free of Streamlit so it can be benchmarked."""
+import pandas as pd
+
+# === Styled Table Helper ===
+def styled_table(df_subset):
+    return df_subset.style \
+        .format({
+            'Departure': lambda x: x.strftime('%Y-%m-%d'),
+            'Return': lambda x: x.strftime('%Y-%m-%d'),
+            'Length': '{:.0f}'.format,
+            'Allowance': '{:.0f}'.format,
+            'Restored': '{:.0f}'.format,
+            'New Balance': '{:.0f}'.format,
+            'Date': lambda x: x.strftime('%Y-%m-%d') if isinstance(x, pd.Timestamp) else x
+        }, na_rep='') \
+        .set_table_styles([
+            {'selector': 'thead th', 'props': [('background-color', '#0f4c81'), ('color', 'white'), ('text-align', 'center')]},
+            {'selector': 'tbody td', 'props': [('text-align', 'center')]},
+            {'selector': 'tr:nth-child(even)', 'props': [('background-color', '#f2f2f2')]},
+            {'selector': 'tr:nth-child(odd)', 'props': [('background-color', '#ffffff')]}
+        ]) \
+        .set_properties(**{'border': '1px solid #ccc', 'border-radius': '6px', 'padding': '6px'})
+
+# === Fast Table Path ===
+COUNT_COLUMNS = ('Length', 'Allowance', 'Restored', 'New Balance')
+
+def table_frame(df_subset):
+    """Display-ready copy of `df_subset` for a plain Arrow-backed grid: counts become nullable integers
+    with one cast per column, dates stay datetime64 for the grid's date formatting. No per-cell Python."""
+    return df_subset.assign(**{
+        column: df_subset[column].round().astype('Int64') for column in COUNT_COLUMNS if column in df_subset
+    })
+
+# === FullCalendar Embed ===
+def fullcalendar_html(events_source, assets_html):
+    return f"""
+<!DOCTYPE html>
+<html>
+<head>
+  {assets_html}
+  <style>
+    #calendar {{ max-width: 1000px; margin: 20px auto; }}
+    .fc-daygrid-day-number {{ font-size: 1.5em; }}
+    .day-allowance {{ font-size: 0.8em; text-align: center; display: block; margin-top: 20px; color: #333; }}
+    .fc-event-title {{ font-weight: bold; }}
+  </style>
+  <script>
+    document.addEventListener('DOMContentLoaded', function() {{
+      var calendarEl = document.getElementById('calendar');
+      var calendar = new FullCalendar.Calendar(calendarEl, {{
+        initialView: 'dayGridMonth',
+        headerToolbar: {{
+          left: 'prev,next today',
+          center: 'title',
+          right: 'multiMonthYear,dayGridMonth,timeGridWeek,timeGridDay'
+        }},
+        views: {{
+          multiMonthYear: {{ type: 'multiMonth', duration: {{ months: 12 }}, buttonText: 'Yearly' }}
+        }},
+        events: {events_source},
+        eventContent: function(arg) {{
+          let container = document.createElement('div');
+          container.innerHTML = arg.event.title;
+          return {{ domNodes: [container] }};
+        }},
+        eventMouseEnter: function(info) {{
+          if (info.event.extendedProps) {{
+            const tooltip = document.createElement('div');
+            tooltip.id = 'tooltip';
+            tooltip.style.position = 'absolute';
+            tooltip.style.background = '#333';
+            tooltip.style.color = 'white';
+            tooltip.style.padding = '6px';
+            tooltip.style.borderRadius = '4px';
+            tooltip.style.zIndex = 10001;
+            tooltip.innerHTML = `<b>${{info.event.title}}</b><br>Type: ${{info.event.extendedProps.type}}<br>Duration: ${{info.event.extendedProps.length}}<br>Allowance: ${{info.event.extendedProps.allowance}} days`;
+            document.body.appendChild(tooltip);
+            info.el.onmousemove = function(e) {{
+              tooltip.style.left = e.pageX + 10 + 'px';
+              tooltip.style.top = e.pageY + 10 + 'px';
+            }};
+          }}
+        }},
+        eventMouseLeave: function(info) {{
+          const tooltip = document.getElementById('tooltip');
+          if (tooltip) tooltip.remove();
+        }}
+      }});
+      calendar.render();
+    }});
+  </script>
+</head>
+<body>
+  <div id='calendar'></div>
+</body>
+</html>
+"""
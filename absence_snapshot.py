@@ -0,0 +1,112 @@
+"""Local on-disk snapshots of loaded trips and computed tracker results, so the app can render before
+(or without) reaching Google Sheets. Frames are stored as Parquet, arrays as .npz, metadata as JSON."""
+import json
+import os
+import shutil
+import tempfile
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+SNAPSHOT_FORMAT = 1
+# Everything a snapshot read or write can raise for a bad file or an unstorable frame, as opposed to a bug.
+SNAPSHOT_ERRORS = (OSError, ValueError, TypeError, pa.ArrowException)
+
+def replace_directory(path, write):
+    """Build a fresh `path` with `write(staging_dir)` and swap it in, so readers never see a partial one.
+
+    Staging and retired directories get unique names next to `path`, so concurrent writers (threads or
+    processes) never share one; the last swap wins.
+    """
+    parent, name = os.path.split(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f"{name}.tmp-", dir=parent)
+    retired = tempfile.mkdtemp(prefix=f"{name}.old-", dir=parent)
+    try:
+        write(staging)
+        while True:
+            try:
+                os.replace(path, os.path.join(retired, name))
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(staging, path)
+                break
+            except OSError:
+                # Another writer swapped its copy in between our two renames: retire that one too.
+                if not os.path.isdir(path):
+                    raise
+                shutil.rmtree(os.path.join(retired, name), ignore_errors=True)
+    finally:
+        shutil.rmtree(retired, ignore_errors=True)
+        shutil.rmtree(staging, ignore_errors=True)
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("format") == SNAPSHOT_FORMAT else None
+
+def write_trips_snapshot(path, df, date_fallback, meta):
+    """Save the loaded trips frame, its date fallback report and JSON-serializable sync `meta`."""
+    def write(staging):
+        df.to_parquet(os.path.join(staging, "trips.parquet"))
+        date_fallback.to_parquet(os.path.join(staging, "date_fallback.parquet"))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"format": SNAPSHOT_FORMAT, **meta}, f)
+    replace_directory(path, write)
+
+def read_trips_snapshot(path):
+    """{"df", "date_fallback", "meta"} from `write_trips_snapshot`, or None if missing or unreadable."""
+    meta = read_meta(path)
+    if meta is None:
+        return None
+    try:
+        df = pd.read_parquet(os.path.join(path, "trips.parquet"))
+        date_fallback = pd.read_parquet(os.path.join(path, "date_fallback.parquet"))
+    except SNAPSHOT_ERRORS:
+        return None
+    return {"df": df, "date_fallback": date_fallback, "meta": meta}
+
+def write_tracker_snapshot(path, tracker):
+    """Save a tracker dict from absence_core (frames, balance arrays and the scalars it was built for)."""
+    def write(staging):
+        tracker["df"].to_parquet(os.path.join(staging, "df.parquet"))
+        tracker["restoration"].to_parquet(os.path.join(staging, "restoration.parquet"))
+        np.savez(os.path.join(staging, "arrays.npz"), codes=tracker["codes"], bitmap=tracker["bitmap"],
+                 rolling=tracker["rolling"])
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"format": SNAPSHOT_FORMAT, "version": list(tracker["version"]), "digest": tracker["digest"],
+                       "today": tracker["today"].isoformat(), "rows": tracker["rows"],
+                       "travelers": tracker["travelers"], "span_start": int(tracker["span_start"])}, f)
+    replace_directory(path, write)
+
+def read_tracker_snapshot(path):
+    """The tracker dict saved by `write_tracker_snapshot`, or None if missing or unreadable."""
+    meta = read_meta(path)
+    if meta is None:
+        return None
+    try:
+        df = pd.read_parquet(os.path.join(path, "df.parquet"))
+        restoration = pd.read_parquet(os.path.join(path, "restoration.parquet"))
+        with np.load(os.path.join(path, "arrays.npz")) as arrays:
+            codes, bitmap, rolling = arrays["codes"], arrays["bitmap"], arrays["rolling"]
+    except (*SNAPSHOT_ERRORS, KeyError):
+        return None
+    return {
+        "today": date.fromisoformat(meta["today"]),
+        "rows": meta["rows"],
+        "df": df,
+        "codes": codes,
+        "travelers": meta["travelers"],
+        "span_start": np.int64(meta["span_start"]),
+        "bitmap": bitmap,
+        "rolling": rolling,
+        "restoration": restoration,
+        "version": tuple(meta["version"]),
+        "digest": meta.get("digest"),
+    }
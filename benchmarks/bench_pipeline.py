@@ -0,0 +1,94 @@
+"""Time each stage of the tracker pipeline on synthetic histories at growing scales.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --scales 1 10 100 1000 --output bench_results.json
+
+Each scale multiplies the number of travelers; every stage is run `--repeat` times and the fastest
+run is kept. Results are written as JSON so runs can be compared over time.
+"""
+import argparse
+import json
+import platform
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from absence_core import trips_frame, compute_tracker, traveler_view
+from absence_profiling import StageProfiler
+from absence_render import styled_table, table_frame, fullcalendar_html
+from benchmarks.synthetic_trips import TRIP_LENGTHS, synthetic_trip_rows
+
+CDN_ASSETS = "<script src='https://cdn.jsdelivr.net/npm/fullcalendar@6.1.8/index.global.min.js'></script>"
+
+def run_pipeline(profiler, header, rows, today):
+    """The app's pipeline, timed by the stages absence_core.compute_tracker and traveler_view report.
+
+    Grouped stages cover every traveler; the view stages build the first traveler's page, which is
+    what one interaction in the app pays for.
+    """
+    with profiler.stage("parse"):
+        trips, _ = trips_frame(header, rows)
+    tracker = compute_tracker(trips, today, profiler)
+    travelers, rolling = tracker["travelers"], tracker["rolling"]
+    view = traveler_view(tracker, travelers[0], profiler)
+    with profiler.stage("styled_table"):
+        styled_table(view["df"][['Departure', 'Return', 'Length', 'Allowance']]).to_html()
+        styled_table(view["restoration_df"][['Date', 'Restored', 'New Balance']]).to_html()
+    with profiler.stage("table_frame"):
+        # st.dataframe ships plain frames to the browser as Arrow.
+        pa.Table.from_pandas(table_frame(view["df"][['Departure', 'Return', 'Length', 'Allowance']]))
+        pa.Table.from_pandas(table_frame(view["restoration_df"][['Date', 'Restored', 'New Balance']]))
+    with profiler.stage("html_build"):
+        html = fullcalendar_html(json.dumps(view["events"] + view["daily_events"]), CDN_ASSETS)
+    return {"trips": len(trips), "travelers": len(travelers), "span_days": rolling.shape[1], "html_bytes": len(html.encode())}
+
+def benchmark(scales, trips_per_traveler, distribution, repeat, seed, trace_memory):
+    today = date.today()
+    results = []
+    for scale in scales:
+        header, rows = synthetic_trip_rows(travelers=scale, trips_per_traveler=trips_per_traveler,
+                                           distribution=distribution, seed=seed)
+        best = {}
+        for _ in range(repeat):
+            profiler = StageProfiler(trace_memory=trace_memory)
+            sizes = run_pipeline(profiler, header, rows, today)
+            for record in profiler.records:
+                kept = best.get(record["stage"])
+                if kept is None or record["wall_s"] < kept["wall_s"]:
+                    best[record["stage"]] = record
+        for record in best.values():
+            results.append({"scale": scale, "rows": len(rows), **sizes, **record})
+            print(f"{scale:>6}x {record['stage']:<14} {record['wall_s'] * 1000:10.2f} ms"
+                  f"  peak {(record['peak_bytes'] or 0) / 2**20:8.2f} MiB")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--trips-per-traveler", type=int, default=60)
+    parser.add_argument("--distribution", choices=TRIP_LENGTHS, default="geometric")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows every stage down)")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.scales, args.trips_per_traveler, args.distribution, args.repeat, args.seed,
+                        trace_memory=not args.no_memory)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Seeded synthetic trip histories shaped like the Trips worksheet (day-first date strings)."""
+import numpy as np
+import pandas as pd
+
+HEADER = ["Departure", "Return", "Traveler"]
+TRIP_LENGTHS = ("geometric", "lognormal", "uniform")
+
+def trip_lengths(rng, size, distribution="geometric", mean_days=10):
+    """Nights away per trip (Return - Departure in days, always >= 1)."""
+    if distribution == "geometric":
+        lengths = rng.geometric(1 / mean_days, size)
+    elif distribution == "lognormal":
+        lengths = np.rint(rng.lognormal(np.log(mean_days), 0.8, size))
+    elif distribution == "uniform":
+        lengths = rng.integers(1, 2 * mean_days, size)
+    else:
+        raise ValueError(f"Unknown trip length distribution: {distribution!r}")
+    return np.maximum(lengths, 1).astype(np.int64)
+
+def synthetic_trip_rows(travelers=1, trips_per_traveler=60, years=10, distribution="geometric",
+                        mean_days=10, overlap_rate=0.02, malformed_rate=0.01, start="2015-01-01", seed=0):
+    """Return (header, rows) like `worksheet.get_all_values()` would, rows in append (departure) order.
+
+    `overlap_rate` of trips start inside the traveler's previous trip. `malformed_rate` of rows are
+    blanked, inverted (return before departure) or duplicated, as hand-edited sheets tend to be.
+    """
+    rng = np.random.default_rng(seed)
+    n = travelers * trips_per_traveler
+    start_day = np.datetime64(start, "D")
+    traveler_ids = np.repeat(np.arange(travelers), trips_per_traveler)
+
+    departures = np.sort(rng.integers(0, years * 365, (travelers, trips_per_traveler)), axis=1).ravel()
+    lengths = trip_lengths(rng, n, distribution, mean_days)
+    overlapping = rng.random(n) < overlap_rate
+    overlapping[::trips_per_traveler] = False
+    previous = np.roll(departures, 1)
+    departures = np.where(overlapping, previous + np.maximum(np.roll(lengths, 1) // 2, 1), departures)
+    returns = departures + lengths
+
+    departure_dates = pd.DatetimeIndex(start_day + departures.astype("timedelta64[D]")).strftime("%d/%m/%Y")
+    return_dates = pd.DatetimeIndex(start_day + returns.astype("timedelta64[D]")).strftime("%d/%m/%Y")
+    rows = [[d, r, f"Traveler {t:05d}"] for d, r, t in zip(departure_dates, return_dates, traveler_ids)]
+
+    for i in np.flatnonzero(rng.random(n) < malformed_rate):
+        kind = rng.integers(3)
+        if kind == 0:
+            rows[i][int(rng.integers(2))] = ""
+        elif kind == 1:
+            rows[i][0], rows[i][1] = rows[i][1], rows[i][0]
+        else:
+            rows[i] = list(rows[i - 1])
+
+    order = np.argsort(departures, kind="stable")
+    return HEADER, [rows[i] for i in order]
@@ -0,0 +1,35 @@
+"""Batch report over a directory of trip CSVs, including files that hold no trips."""
+import os
+import tempfile
+import unittest
+from datetime import date
+
+import pandas as pd
+
+from absence_batch import batch_report
+
+class BatchReportTest(unittest.TestCase):
+    def test_files_without_trips_have_full_allowance(self):
+        files = {
+            "header_only.csv": "Departure,Return\n",
+            "unreadable.csv": "Departure,Return,Traveler\nsoon,later,Ann\n",
+            "trips.csv": "Departure,Return\n01/01/2026,12/01/2026\n",
+            "broken.csv": "When,Where\n01/01/2026,Paris\n",
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for name, text in files.items():
+                with open(os.path.join(directory, name), "w") as f:
+                    f.write(text)
+            report = batch_report([os.path.join(directory, name) for name in sorted(files)], date(2026, 10, 15),
+                                  workers=1).set_index("file")
+
+        for name in ("header_only.csv", "unreadable.csv"):
+            self.assertTrue(pd.isna(report.loc[name, "error"]))
+            self.assertEqual(report.loc[name, "allowance_today"], 180)
+            self.assertEqual(report.loc[name, "breach_days"], 0)
+        self.assertEqual(report.loc["trips.csv", "allowance_today"], 170)
+        self.assertEqual(report.loc["trips.csv", "restoration_1_date"], pd.Timestamp(2027, 1, 11))
+        self.assertTrue(report.loc["broken.csv", "error"].startswith("KeyError"))
+
+if __name__ == "__main__":
+    unittest.main()
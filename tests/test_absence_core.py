@@ -0,0 +1,104 @@
+"""Randomized equivalence checks of the vectorized tracker against brute-force day counts and against
+a full recompute. Run from the repository root with `python -m unittest discover tests`."""
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from absence_core import (
+    ALLOWANCE_DAYS, WINDOW_DAYS, compute_tracker, extend_tracker, roll_tracker_forward, traveler_view,
+)
+
+CASES = 200
+
+def random_trips(rng, first=date(2016, 1, 1), days=3500):
+    """Departure-sorted trips of up to four travelers, some overlapping and some without a return."""
+    n = int(rng.integers(1, 60))
+    departures = pd.Timestamp(first) + pd.to_timedelta(np.sort(rng.integers(0, days, n)), unit="D")
+    returns = pd.Series(departures + pd.to_timedelta(rng.integers(1, 60, n), unit="D"))
+    returns[rng.random(n) < 0.05] = pd.NaT
+    travelers = rng.choice([f"P{i}" for i in range(int(rng.integers(1, 5)))], n)
+    return pd.DataFrame({"Departure": departures, "Return": returns, "Traveler": travelers})
+
+def abroad_days(tracker):
+    """{traveler code: set of day ordinals spent abroad}, counted trip by trip."""
+    days = {code: set() for code in range(len(tracker["travelers"]))}
+    for code, trip in zip(tracker["codes"], tracker["df"].itertuples()):
+        if pd.notna(trip.Departure) and pd.notna(trip.Return):
+            first, last = trip.Departure.toordinal() + 1, trip.Return.toordinal() - 1
+            days[code].update(range(first, last + 1))
+    return days
+
+def days_in_window(days, end):
+    """Days abroad in the rolling window ending on day ordinal `end`."""
+    return sum(1 for day in days if end - WINDOW_DAYS < day <= end)
+
+class BruteForceTest(unittest.TestCase):
+    def test_allowance_matches_day_count(self):
+        rng = np.random.default_rng(1)
+        for _ in range(CASES):
+            today = date(2016, 1, 1) + timedelta(days=int(rng.integers(0, 4000)))
+            tracker = compute_tracker(random_trips(rng), today)
+            days = abroad_days(tracker)
+            for code, trip in zip(tracker["codes"], tracker["df"].itertuples()):
+                if pd.notna(trip.Return):
+                    used = days_in_window(days[code], trip.Return.toordinal())
+                    self.assertEqual(trip.Allowance, ALLOWANCE_DAYS - used)
+
+    def test_new_balance_matches_rolling_balance(self):
+        rng = np.random.default_rng(2)
+        today = date(2026, 1, 1)
+        for _ in range(CASES):
+            # Every trip is over by today, so nothing but restorations changes the balance afterwards.
+            tracker = compute_tracker(random_trips(rng, first=date(2024, 1, 1), days=600), today)
+            days = abroad_days(tracker)
+            restoration = tracker["restoration"]
+            for code, schedule in restoration.groupby(tracker["codes"]):
+                self.assertEqual(schedule["Restored"].sum(), days_in_window(days[code], today.toordinal()))
+                dated = schedule.dropna(subset=["Date"])
+                self.assertTrue((dated["Date"] > pd.Timestamp(today)).all())
+                # Restorations on the same day are cumulated one by one; the last one gives the balance.
+                balances = dated.sort_values("Date", kind="stable").groupby("Date")["New Balance"].last()
+                for when, balance in balances.items():
+                    self.assertEqual(balance, ALLOWANCE_DAYS - days_in_window(days[code], when.toordinal()))
+
+class IncrementalTest(unittest.TestCase):
+    def assert_same_tracker(self, actual, expected):
+        self.assertEqual(actual["travelers"], expected["travelers"])
+        self.assertEqual(actual["span_start"], expected["span_start"])
+        pd.testing.assert_frame_equal(actual["df"], expected["df"])
+        pd.testing.assert_frame_equal(actual["restoration"], expected["restoration"])
+        np.testing.assert_array_equal(actual["codes"], expected["codes"])
+        np.testing.assert_array_equal(actual["bitmap"], expected["bitmap"])
+        np.testing.assert_array_equal(actual["rolling"], expected["rolling"])
+        for traveler in expected["travelers"]:
+            actual_view, expected_view = traveler_view(actual, traveler), traveler_view(expected, traveler)
+            pd.testing.assert_frame_equal(actual_view["restoration_df"], expected_view["restoration_df"])
+            self.assertEqual(actual_view["daily_events"], expected_view["daily_events"])
+
+    def test_extend_matches_full_recompute(self):
+        rng = np.random.default_rng(3)
+        for _ in range(CASES):
+            trips = random_trips(rng)
+            today = date(2016, 1, 1) + timedelta(days=int(rng.integers(0, 4000)))
+            split = int(rng.integers(1, len(trips) + 1))
+            base = compute_tracker(trips.iloc[:split], today)
+            extended = extend_tracker(base, trips.iloc[split:], today)
+            if extended is None:
+                self.assertEqual(split, len(trips))
+                continue
+            self.assert_same_tracker(extended, compute_tracker(trips, today))
+
+    def test_roll_forward_matches_full_recompute(self):
+        rng = np.random.default_rng(4)
+        for _ in range(CASES):
+            trips = random_trips(rng)
+            today = date(2016, 1, 1) + timedelta(days=int(rng.integers(0, 4000)))
+            later = today + timedelta(days=int(rng.integers(0, 800)))
+            rolled = roll_tracker_forward(compute_tracker(trips, today), later)
+            self.assert_same_tracker(rolled, compute_tracker(trips, later))
+        self.assertIsNone(roll_tracker_forward(compute_tracker(trips, today), today - timedelta(days=1)))
+
+if __name__ == "__main__":
+    unittest.main()
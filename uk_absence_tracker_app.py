@@ -5,7 +5,21 @@ import gspread
 from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 import streamlit.components.v1 as components
-import time
+from absence_core import (
+    DATE_FORMAT, RESTORATIONS_SHOWN, read_trips_csv, trip_columns, columns_frame, compute_tracker, extend_tracker,
+    traveler_view, traveler_trips, roll_tracker_forward, trips_digest,
+)
+from absence_render import styled_table, table_frame, fullcalendar_html
+from absence_profiling import StageProfiler, profile_stage
+from absence_memo import LRUMemo
+from absence_snapshot import (
+    SNAPSHOT_ERRORS, read_trips_snapshot, write_trips_snapshot, read_tracker_snapshot, write_tracker_snapshot,
+)
+import os
+import shutil
+import hashlib
+import threading
+import logging
 
 # === Google Sheets Credentials ===
 def get_google_credentials():
@@ -18,6 +32,399 @@ def get_google_credentials():
 
 GOOGLE_SHEET_NAME = "UK Absence Tracker"
 WORKSHEET_NAME = "Trips"
+SHEET_CACHE_TTL_SECONDS = 300
+SHEET_PROBE_TTL_SECONDS = 10
+# Date cells arrive as day serial numbers and skip string parsing; use ValueRenderOption.formatted to read
+# them as displayed text instead.
+SHEET_VALUE_RENDER = gspread.utils.ValueRenderOption.unformatted
+SHEET_SERIAL_DATES = SHEET_VALUE_RENDER == gspread.utils.ValueRenderOption.unformatted
+# The last successful load and its computed results are kept here for instant cold starts and offline use.
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+snapshot_logger = logging.getLogger("uk_absence_tracker.snapshots")
+
+# One authorized client per process; its session refreshes the token in place and keeps connections pooled.
+@st.cache_resource(show_spinner=False)
+def get_sheets_client():
+    return gspread.authorize(get_google_credentials())
+
+@st.cache_resource(show_spinner=False)
+def get_trips_worksheet(sheet_name, worksheet_name):
+    return get_sheets_client().open(sheet_name).worksheet(worksheet_name)
+
+# A single Drive metadata call; the modified time changes on every edit to any tab of the spreadsheet.
+@st.cache_data(ttl=SHEET_PROBE_TTL_SECONDS, show_spinner=False)
+def get_sheet_revision(sheet_name, worksheet_name):
+    return get_trips_worksheet(sheet_name, worksheet_name).spreadsheet.get_lastUpdateTime()
+
+def snapshot_path(sheet_name, worksheet_name, kind):
+    key = hashlib.sha1(f"{sheet_name}\0{worksheet_name}".encode()).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, key, kind)
+
+# Read once per process: only the first sync state after a cold start is seeded from disk, so the
+# periodic full reload below still goes back to the sheet.
+@st.cache_resource(show_spinner=False)
+def get_saved_trips(sheet_name, worksheet_name):
+    return {"saved": read_trips_snapshot(snapshot_path(sheet_name, worksheet_name, "trips"))}
+
+# Per-worksheet sync state shared across sessions; the TTL forces a periodic full reload.
+@st.cache_resource(ttl=SHEET_CACHE_TTL_SECONDS, show_spinner=False)
+def get_sheet_sync_state(sheet_name, worksheet_name):
+    state = {"lock": threading.Lock(), "revision": None, "letters": None, "row_count": 0, "last_row": None,
+             "snapshot": None, "saved_at": None, "revalidation": None}
+    saved = get_saved_trips(sheet_name, worksheet_name).pop("saved", None)
+    if saved is not None:
+        meta = saved["meta"]
+        state.update(revision=meta["revision"], letters=meta["letters"], row_count=meta["row_count"],
+                     last_row=meta["last_row"], saved_at=meta["saved_at"],
+                     snapshot=sheet_snapshot(saved["df"], saved["date_fallback"]))
+    return state
+
+def sheet_snapshot(df, date_fallback, base_revision=None):
+    # The content hash travels with the frame: a reload can change the trips under an unchanged revision.
+    return {"df": df, "date_fallback": date_fallback, "base_revision": base_revision, "digest": trips_digest(df)}
+
+def save_sheet_snapshot(sheet_name, worksheet_name, state):
+    meta = {key: state[key] for key in ("revision", "letters", "row_count", "last_row")}
+    try:
+        write_trips_snapshot(snapshot_path(sheet_name, worksheet_name, "trips"), state["snapshot"]["df"],
+                             state["snapshot"]["date_fallback"], {**meta, "saved_at": datetime.now().isoformat(timespec="seconds")})
+    except SNAPSHOT_ERRORS as e:
+        snapshot_logger.warning("Could not save the trips snapshot: %s", e)
+
+def offline_trips(sheet_name, worksheet_name, state):
+    """(revision, snapshot, saved_at) of the newest trips available without the sheet, or None."""
+    if state["snapshot"] is not None:
+        return state["revision"], state["snapshot"], state["saved_at"]
+    saved = read_trips_snapshot(snapshot_path(sheet_name, worksheet_name, "trips"))
+    if saved is None:
+        return None
+    snapshot = sheet_snapshot(saved["df"], saved["date_fallback"])
+    return saved["meta"]["revision"], snapshot, saved["meta"]["saved_at"]
+
+def revalidate_in_background(sheet_name, worksheet_name, state):
+    """Check a disk-seeded sync state against the sheet on a worker thread; the sync swaps in new data
+    only if the revision moved. Returns the (possibly already running) thread."""
+    def revalidate():
+        try:
+            revision = get_trips_worksheet(sheet_name, worksheet_name).spreadsheet.get_lastUpdateTime()
+            sync_sheet_trips(sheet_name, worksheet_name, revision)
+        except Exception as e:
+            snapshot_logger.warning("Revalidating the saved trips failed: %s", e)
+    with state["lock"]:
+        if state["revalidation"] is None:
+            state["revalidation"] = threading.Thread(target=revalidate, daemon=True)
+            state["revalidation"].start()
+        return state["revalidation"]
+
+def fetch_trip_columns(sheet, letters, first_row):
+    """The `letters` columns ({header: column letter}) from sheet row `first_row` down, in one batch_get.
+
+    Each column comes back as a flat list, padded with '' to the longest since trailing blanks are omitted.
+    """
+    ranges = [f"{letter}{first_row}:{letter}" for letter in letters.values()]
+    fetched = sheet.batch_get(ranges, major_dimension=gspread.utils.Dimension.cols,
+                              value_render_option=SHEET_VALUE_RENDER)
+    columns = {name: values[0] if values else [] for name, values in zip(letters, fetched)}
+    length = max(map(len, columns.values()), default=0)
+    return {name: values + [''] * (length - len(values)) for name, values in columns.items()}
+
+def sync_sheet_trips(sheet_name, worksheet_name, revision):
+    """Bring the cached trips up to `revision`, fetching only rows appended since the last sync.
+
+    Only the Departure, Return and Traveler columns are read. The last previously seen row is re-read
+    as an anchor; if it changed, rows were removed, or the revision moved without new rows, the whole
+    worksheet is reloaded instead. An edit further up made together with new rows below is not detected:
+    the edited rows stay stale until the next full reload, at most SHEET_CACHE_TTL_SECONDS later when the
+    sync state expires (or on "Force reload"). Results derived from the trips are checked against their
+    content, not just the revision, so the reload replaces them too.
+    Returns a snapshot dict whose frame is shared across sessions and must be treated as read-only.
+    """
+    state = get_sheet_sync_state(sheet_name, worksheet_name)
+    with state["lock"]:
+        if state["revision"] == revision:
+            return state["snapshot"]
+        sheet = get_trips_worksheet(sheet_name, worksheet_name)
+        previous = state["snapshot"]
+        columns = None
+        if previous is not None and state["row_count"]:
+            fetched = fetch_trip_columns(sheet, state["letters"], state["row_count"] + 1)
+            fetched_rows = len(next(iter(fetched.values()), []))
+            if fetched_rows > 1 and [values[0] for values in fetched.values()] == state["last_row"]:
+                columns = {name: values[1:] for name, values in fetched.items()}
+        if columns is None:
+            header = sheet.row_values(1)
+            state["letters"] = {name: gspread.utils.rowcol_to_a1(1, header.index(name) + 1)[:-1]
+                                for name in trip_columns(header)}
+            columns = fetch_trip_columns(sheet, state["letters"], 2)
+            df, date_fallback = columns_frame(columns, serials=SHEET_SERIAL_DATES)
+            snapshot = sheet_snapshot(df, date_fallback)
+        else:
+            appended, date_fallback = columns_frame(columns, first_row=len(previous["df"]), serials=SHEET_SERIAL_DATES)
+            snapshot = sheet_snapshot(pd.concat([previous["df"], appended]),
+                                      pd.concat([previous["date_fallback"], date_fallback], ignore_index=True),
+                                      state["revision"])
+        state["row_count"] = len(snapshot["df"])
+        state["last_row"] = [values[-1] for values in columns.values()] if state["row_count"] else None
+        state["revision"], state["snapshot"], state["saved_at"] = revision, snapshot, None
+        save_sheet_snapshot(sheet_name, worksheet_name, state)
+        return snapshot
+
+# Latest results per data source, used as the starting point for incremental updates.
+@st.cache_resource(show_spinner=False)
+def get_tracker_store():
+    return {}
+
+# Everything below the data load depends only on the trips' content and the date. Derived results are
+# memoized under a hash of that content, so reruns with unchanged trips (auto-refresh ticks, widget changes,
+# a new revision from an edit elsewhere in the spreadsheet, the same file uploaded again) reuse them.
+DERIVED_MEMO_ENTRIES = 64
+
+@st.cache_resource(show_spinner=False)
+def get_derived_memo():
+    return LRUMemo(DERIVED_MEMO_ENTRIES)
+
+# An uploaded file's content is fixed by its id; sheet snapshots carry their own digest.
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_trips_digest(data_version, _df):
+    return trips_digest(_df)
+
+def derive_tracker(data_version, df, today, digest, base_version=None, profiler=None):
+    """The tracker for `df` (content hash `digest`), reusing or extending the source's latest one.
+
+    A base is reused only if it was built from the same content, and extended only if its trips are
+    still the first rows of `df`: a sync can keep the revision while the trips change underneath it.
+    """
+    store = get_tracker_store()
+    saved_path = snapshot_path(*data_version[1:3], "tracker") if data_version[0] == "sheet" else None
+    base = store.get(data_version[:-1])
+    if base is None and saved_path is not None:
+        base = read_tracker_snapshot(saved_path)
+    rolled = base is not None and base["today"] != today
+    if rolled:
+        # Past midnight only the date-dependent balance arrays need extending, not a full recompute.
+        with profile_stage(profiler, "date rollover"):
+            base = roll_tracker_forward(base, today)
+    if base is not None and base["version"] == data_version and base.get("digest") == digest:
+        store[data_version[:-1]] = base
+        if rolled:
+            save_tracker_snapshot(saved_path, base)
+        return base
+    tracker = None
+    if (base_version is not None and base is not None and base["version"] == base_version
+            and base.get("digest") == trips_digest(df.iloc[:base["rows"]])):
+        tracker = extend_tracker(base, df.iloc[base["rows"]:], today, profiler)
+    if tracker is None:
+        tracker = compute_tracker(df, today, profiler)
+    tracker["version"], tracker["digest"] = data_version, digest
+    store[data_version[:-1]] = tracker
+    save_tracker_snapshot(saved_path, tracker)
+    return tracker
+
+def save_tracker_snapshot(saved_path, tracker):
+    if saved_path is None:
+        return
+    try:
+        write_tracker_snapshot(saved_path, tracker)
+    except SNAPSHOT_ERRORS as e:
+        snapshot_logger.warning("Could not save the tracker snapshot: %s", e)
+
+# Switching travelers only slices the grouped results; each traveler's view is memoized alongside them.
+# The trips part of a view doesn't depend on the date, so it is memoized without it and survives midnight.
+def build_traveler_view(tracker, traveler, restorations, trips, profiler=None):
+    view = traveler_view(tracker, traveler, profiler, restorations, trips)
+    view["calendar_events"] = view["events"] + view["daily_events"]
+    view["calendar_events_json"] = json.dumps(view["calendar_events"])
+    view["calendar_digest"] = hashlib.sha1(view["calendar_events_json"].encode()).hexdigest()[:16]
+    view["calendar_months"] = event_month_range(view["calendar_events"])
+    return view
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_uploaded_trips(file_id, _uploaded_file):
+    _uploaded_file.seek(0)
+    return read_trips_csv(_uploaded_file)
+
+def report_date_fallback(date_fallback):
+    """Flag the dates that didn't match DATE_FORMAT and list how each one was read."""
+    unparsed = int(date_fallback["Parsed"].isna().sum())
+    st.warning(f"⚠️ {len(date_fallback)} date(s) did not match {DATE_FORMAT} and were inferred"
+               + (f"; {unparsed} could not be read and are ignored." if unparsed else "."))
+    with st.expander("Dates read by inference"):
+        st.dataframe(date_fallback, hide_index=True, use_container_width=True)
+
+# === Tables ===
+# The Styler renders every cell as HTML, so it is only used for small tables when asked for; otherwise the
+# frame goes to the grid as-is and column configs do the formatting client-side.
+STYLED_TABLE_MAX_ROWS = 500
+TABLE_COLUMN_CONFIG = {
+    **{column: st.column_config.DateColumn(column, format="YYYY-MM-DD") for column in ("Departure", "Return", "Date")},
+    **{column: st.column_config.NumberColumn(column, format="%d") for column in ("Length", "Allowance", "Restored", "New Balance")},
+}
+
+def show_table(df_subset):
+    if styled_tables and len(df_subset) <= STYLED_TABLE_MAX_ROWS:
+        st.dataframe(styled_table(df_subset), use_container_width=True)
+    else:
+        st.dataframe(table_frame(df_subset), use_container_width=True, column_config=TABLE_COLUMN_CONFIG)
+
+TRIP_PAGE_SIZES = [25, 50, 100, 250]
+
+def jump_to_departure(departures, page_size):
+    """Turn to the page holding the first trip departing on or after the chosen date."""
+    day = st.session_state["trip_jump"]
+    if day is not None:
+        st.session_state["trip_page"] = int(departures.searchsorted(pd.Timestamp(day))) // page_size + 1
+
+def show_trip_history(df_subset):
+    """One page of the trip history; only that page is formatted and sent to the browser."""
+    size_column, jump_column, page_column = st.columns(3)
+    page_size = size_column.selectbox("Trips per page", TRIP_PAGE_SIZES, index=1, key="trip_page_size")
+    pages = max(-(-len(df_subset) // page_size), 1)
+    st.session_state["trip_page"] = min(st.session_state.get("trip_page", 1), pages)
+    jump_column.date_input("Jump to departure", value=None, key="trip_jump", format="YYYY-MM-DD",
+                           on_change=jump_to_departure, args=(df_subset['Departure'], page_size))
+    page = page_column.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key="trip_page")
+    start = (page - 1) * page_size
+    show_table(df_subset.iloc[start:start + page_size])
+    st.caption(f"Trips {min(start + 1, len(df_subset))}–{min(start + page_size, len(df_subset))} of {len(df_subset)}")
+
+# === Section Timings ===
+timing_logger = logging.getLogger("uk_absence_tracker.timings")
+if not timing_logger.handlers:
+    timing_handler = logging.StreamHandler()
+    timing_handler.setFormatter(logging.Formatter("%(message)s"))
+    timing_logger.addHandler(timing_handler)
+    timing_logger.setLevel(logging.INFO)
+    timing_logger.propagate = False
+
+def report_section_timings(records, cache_stats):
+    """Show one rerun's section timings and the derived results cache counters in the sidebar, and emit
+    both as JSON log lines."""
+    for record in records:
+        timing_logger.info(json.dumps({"event": "section_timing", **record}))
+    timing_logger.info(json.dumps({"event": "derived_cache", **cache_stats}))
+    with st.sidebar.expander("⏱️ Section timings", expanded=False):
+        hits, misses = sum(cache_stats["hits"].values()), sum(cache_stats["misses"].values())
+        st.caption(f"Derived results cache: {hits} hits, {misses} misses, "
+                   f"{cache_stats['entries']}/{cache_stats['max_entries']} entries.")
+        if not records:
+            st.caption("Nothing ran.")
+            return
+        timings = pd.DataFrame({
+            "Section": [record["stage"] for record in records],
+            "Wall (ms)": [record["wall_s"] * 1000 for record in records],
+            "CPU (ms)": [record["cpu_s"] * 1000 for record in records],
+            "Peak (KiB)": [(record["peak_bytes"] or 0) / 1024 for record in records],
+        })
+        st.dataframe(timings, hide_index=True, use_container_width=True,
+                     column_config={column: st.column_config.NumberColumn(format="%.1f") for column in timings.columns[1:]})
+        st.caption("Sections missing from the list were served from cache.")
+
+# === Static Assets ===
+# Files under ./static are served by Streamlit at app/static/ when server.enableStaticServing is on.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+FULLCALENDAR_VERSION = "6.1.8"
+FULLCALENDAR_CDN_URL = f"https://cdn.jsdelivr.net/npm/fullcalendar@{FULLCALENDAR_VERSION}/"
+FULLCALENDAR_LOCAL_DIR = os.path.join(STATIC_DIR, "fullcalendar", FULLCALENDAR_VERSION)
+# "auto" serves the vendored copy whenever it is present and static serving is on; "local" and "cdn" force one.
+FULLCALENDAR_ASSETS = "auto"
+
+def static_url(*parts):
+    base_path = st.get_option("server.baseUrlPath").strip("/")
+    return "/" + "/".join(part for part in (base_path, "app/static", *parts) if part)
+
+def fullcalendar_assets_html():
+    local_available = (st.get_option("server.enableStaticServing")
+                       and os.path.isfile(os.path.join(FULLCALENDAR_LOCAL_DIR, "index.global.min.js")))
+    if FULLCALENDAR_ASSETS == "local" or (FULLCALENDAR_ASSETS == "auto" and local_available):
+        # The path is versioned, so every calendar iframe on the page shares one cached download.
+        # v6 injects its own styles from the script, so there is no stylesheet to vendor.
+        return f"<script src='{static_url('fullcalendar', FULLCALENDAR_VERSION, 'index.global.min.js')}'></script>"
+    return (f"<link href='{FULLCALENDAR_CDN_URL}index.global.min.css' rel='stylesheet' />\n"
+            f"  <script src='{FULLCALENDAR_CDN_URL}index.global.min.js'></script>")
+
+# === Lazy Calendar Feed ===
+# Events are split into one JSON file per calendar month under the static folder, and the
+# calendar fetches only the months it is showing.
+EVENT_CHUNKS_DIR = os.path.join(STATIC_DIR, "events")
+EVENT_CHUNK_VERSIONS_KEPT = 32
+calendar_logger = logging.getLogger("uk_absence_tracker.calendar")
+
+def month_index(day):
+    return int(day[:4]) * 12 + int(day[5:7]) - 1
+
+def month_key(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def month_chunks(events):
+    """Group events by every month they overlap (all-day ends are exclusive)."""
+    chunks = {}
+    for event in events:
+        last_day = (datetime.strptime(event["end"], "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        for index in range(month_index(event["start"]), max(month_index(last_day), month_index(event["start"])) + 1):
+            chunks.setdefault(index, []).append(event)
+    return chunks
+
+def event_month_range(events):
+    """(first, last) month keys covered by `events`, or (None, None) when there are none."""
+    if not events:
+        return None, None
+    last_day = (datetime.strptime(max(event["end"] for event in events), "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+    return month_key(month_index(min(event["start"] for event in events))), month_key(month_index(last_day))
+
+def publish_event_chunks(digest, events):
+    """Write the month chunks for `digest` unless they are already on disk. Raises OSError on failure."""
+    chunk_dir = os.path.join(EVENT_CHUNKS_DIR, digest)
+    if os.path.isdir(chunk_dir):
+        os.utime(chunk_dir)
+        return
+    staging_dir = f"{chunk_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(staging_dir, exist_ok=True)
+    try:
+        for index, month_events in month_chunks(events).items():
+            with open(os.path.join(staging_dir, f"{month_key(index)}.json"), "w") as f:
+                json.dump(month_events, f)
+    except OSError:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    try:
+        os.rename(staging_dir, chunk_dir)
+    except OSError:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    prune_event_chunks()
+
+def prune_event_chunks():
+    versions = sorted(
+        (entry for entry in os.scandir(EVENT_CHUNKS_DIR) if entry.is_dir() and not entry.name.endswith(".tmp")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in versions[EVENT_CHUNK_VERSIONS_KEPT:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+def lazy_events_source(digest, first_month, last_month):
+    chunk_url = static_url("events", digest) + "/"
+    return f"""(function() {{
+          var chunkUrl = {json.dumps(chunk_url)}, firstMonth = {json.dumps(first_month)}, lastMonth = {json.dumps(last_month)};
+          var chunks = {{}};
+          function pad(n) {{ return (n < 10 ? '0' : '') + n; }}
+          return function(info, success, failure) {{
+            var months = [];
+            var last = new Date(info.end.getTime() - 1);
+            for (var d = new Date(info.start.getFullYear(), info.start.getMonth(), 1); d <= last; d.setMonth(d.getMonth() + 1)) {{
+              var key = d.getFullYear() + '-' + pad(d.getMonth() + 1);
+              if (firstMonth && key >= firstMonth && key <= lastMonth) months.push(key);
+            }}
+            Promise.all(months.map(function(key) {{
+              if (!chunks[key]) {{
+                chunks[key] = fetch(chunkUrl + key + '.json').then(function(r) {{ return r.ok ? r.json() : []; }});
+              }}
+              return chunks[key];
+            }})).then(function(lists) {{
+              var seen = {{}};
+              success([].concat.apply([], lists).filter(function(e) {{ return !seen[e.id] && (seen[e.id] = true); }}));
+            }}, failure);
+          }};
+        }})()"""
 
 st.set_page_config(page_title="UK Absence Tracker", layout="wide")
 st.title("UK Absence Tracker")
@@ -27,187 +434,110 @@ refresh = st.sidebar.checkbox("🔄 Auto-refresh every 60 seconds")
 st.sidebar.header("📤 Upload Your Trip Data")
 uploaded_file = st.sidebar.file_uploader("Upload CSV", type="csv")
 use_google_sheet = st.sidebar.checkbox("Load from Google Sheet", value=True)
+if use_google_sheet and st.sidebar.button("♻️ Force reload from Google Sheet"):
+    get_sheet_revision.clear(GOOGLE_SHEET_NAME, WORKSHEET_NAME)
+    get_sheet_sync_state.clear(GOOGLE_SHEET_NAME, WORKSHEET_NAME)
 
-if uploaded_file:
-    df = pd.read_csv(uploaded_file, parse_dates=["Departure", "Return"], dayfirst=True)
-elif use_google_sheet:
-    credentials = get_google_credentials()
-    if credentials:
-        try:
-            client = gspread.authorize(credentials)
-            sheet = client.open(GOOGLE_SHEET_NAME).worksheet(WORKSHEET_NAME)
-            data = sheet.get_all_records()
-            df = pd.DataFrame(data)
-            df['Departure'] = pd.to_datetime(df['Departure'], dayfirst=True)
-            df['Return'] = pd.to_datetime(df['Return'], dayfirst=True)
-            st.sidebar.success("✅ Loaded from Google Sheet")
-        except Exception as e:
-            st.sidebar.error(f"❌ Failed to load: {e}")
-            st.stop()
-    else:
+restorations_shown = st.sidebar.number_input("📈 Balance increase dates shown", min_value=1, max_value=100,
+                                             value=RESTORATIONS_SHOWN)
+styled_tables = st.sidebar.checkbox("🎨 Styled tables", help=f"Only applies to tables up to {STYLED_TABLE_MAX_ROWS} rows.")
+profile_sections = st.sidebar.checkbox("⏱️ Profile page sections")
+lazy_calendar = st.get_option("server.enableStaticServing") and st.sidebar.radio(
+    "📅 Calendar loading", ["Per visible range", "All events inline"]) == "Per visible range"
+
+if not uploaded_file:
+    if not use_google_sheet:
+        st.sidebar.warning("Please upload a CSV or connect to Google Sheets.")
+        st.stop()
+    if "google_credentials" not in st.secrets:
         st.sidebar.error("❌ No credentials found")
         st.stop()
-else:
-    st.sidebar.warning("Please upload a CSV or connect to Google Sheets.")
-    st.stop()
-
-# === Process Data ===
-df = df.sort_values("Departure").reset_index(drop=True)
-df['Length'] = (df['Return'] - df['Departure']).dt.days - 1
-allowance = 180
-balances = []
-
-for i, row in df.iterrows():
-    allowance -= row['Length']
-    balances.append(allowance)
-df['Allowance'] = balances
-
-# === Build Daily Allowance Tracker (Past + Future) ===
-end_future = datetime.today() + timedelta(days=365)
-all_dates = pd.date_range(df['Departure'].min(), end_future)
-daily_events = []
-used_ranges = [pd.date_range(row.Departure + timedelta(days=1), row.Return - timedelta(days=1)) for row in df.itertuples()]
-flat_abroad = pd.concat([pd.Series(x) for x in used_ranges], ignore_index=True)
-
-for day in all_dates:
-    days_abroad = (flat_abroad <= day).sum()
-    remaining = max(180 - days_abroad, 0)
-    daily_events.append({
-        "title": f"📉 {remaining} days left",
-        "start": day.strftime("%Y-%m-%d"),
-        "end": day.strftime("%Y-%m-%d"),
-        "allDay": True,
-        "display": "background",
-        "backgroundColor": "#f0f9ff"
-    })
-
-# === Main Events (Trips) ===
-events = []
-for i, row in df.iterrows():
-    if pd.isnull(row['Departure']) or pd.isnull(row['Return']):
-        continue
-    events.append({
-        "id": str(i),
-        "title": f"{row['Departure'].date()} - {row['Return'].date()}",
-        "start": row['Departure'].strftime("%Y-%m-%d"),
-        "end": (row['Return'] + timedelta(days=1)).strftime("%Y-%m-%d"),
-        "color": "#dc3545",
-        "allDay": True,
-        "extendedProps": {
-            "length": f"{(row['Return'] - row['Departure']).days} days",
-            "type": "Abroad",
-            "allowance": row['Allowance']
-        }
-    })
-
-# === Styled Table Helper ===
-def styled_table(df_subset):
-    return df_subset.style \
-        .format({
-            'Departure': lambda x: x.strftime('%Y-%m-%d'),
-            'Return': lambda x: x.strftime('%Y-%m-%d'),
-            'Length': '{:.0f}'.format,
-            'Allowance': '{:.0f}'.format,
-            'Restored': '{:.0f}'.format,
-            'New Balance': '{:.0f}'.format,
-            'Date': lambda x: x.strftime('%Y-%m-%d') if isinstance(x, pd.Timestamp) else x
-        }) \
-        .set_table_styles([
-            {'selector': 'thead th', 'props': [('background-color', '#0f4c81'), ('color', 'white'), ('text-align', 'center')]},
-            {'selector': 'tbody td', 'props': [('text-align', 'center')]},
-            {'selector': 'tr:nth-child(even)', 'props': [('background-color', '#f2f2f2')]},
-            {'selector': 'tr:nth-child(odd)', 'props': [('background-color', '#ffffff')]}
-        ]) \
-        .set_properties(**{'border': '1px solid #ccc', 'border-radius': '6px', 'padding': '6px'})
-
-# === Show Tables ===
-st.subheader("📋 Trip History")
-st.dataframe(styled_table(df[['Departure', 'Return', 'Length', 'Allowance']]), use_container_width=True)
-
-# === Restoration Dates ===
-restoration = []
-current_balance = df['Allowance'].iloc[-1]
-for row in df.itertuples():
-    date = row.Return + timedelta(days=365)
-    current_balance += row.Length
-    restoration.append({
-        "Date": date,
-        "Restored": row.Length,
-        "New Balance": current_balance
-    })
-restoration_df = pd.DataFrame(restoration).sort_values(by='Date').head(10)
-
-st.subheader("📈 Next 10 Balance Increase Dates")
-st.dataframe(styled_table(restoration_df[['Date', 'Restored', 'New Balance']]), use_container_width=True)
-
-# === FullCalendar Embed ===
-st.subheader("📅 Calendar with Daily Allowance")
-fullcalendar_html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-  <link href='https://cdn.jsdelivr.net/npm/fullcalendar@6.1.8/index.global.min.css' rel='stylesheet' />
-  <script src='https://cdn.jsdelivr.net/npm/fullcalendar@6.1.8/index.global.min.js'></script>
-  <style>
-    #calendar {{ max-width: 1000px; margin: 20px auto; }}
-    .fc-daygrid-day-number {{ font-size: 1.5em; }}
-    .day-allowance {{ font-size: 0.8em; text-align: center; display: block; margin-top: 20px; color: #333; }}
-    .fc-event-title {{ font-weight: bold; }}
-  </style>
-  <script>
-    document.addEventListener('DOMContentLoaded', function() {{
-      var calendarEl = document.getElementById('calendar');
-      var calendar = new FullCalendar.Calendar(calendarEl, {{
-        initialView: 'dayGridMonth',
-        headerToolbar: {{
-          left: 'prev,next today',
-          center: 'title',
-          right: 'multiMonthYear,dayGridMonth,timeGridWeek,timeGridDay'
-        }},
-        views: {{
-          multiMonthYear: {{ type: 'multiMonth', duration: {{ months: 12 }}, buttonText: 'Yearly' }}
-        }},
-        events: {json.dumps(events + daily_events)},
-        eventContent: function(arg) {{
-          let container = document.createElement('div');
-          container.innerHTML = arg.event.title;
-          return {{ domNodes: [container] }};
-        }},
-        eventMouseEnter: function(info) {{
-          if (info.event.extendedProps) {{
-            const tooltip = document.createElement('div');
-            tooltip.id = 'tooltip';
-            tooltip.style.position = 'absolute';
-            tooltip.style.background = '#333';
-            tooltip.style.color = 'white';
-            tooltip.style.padding = '6px';
-            tooltip.style.borderRadius = '4px';
-            tooltip.style.zIndex = 10001;
-            tooltip.innerHTML = `<b>${{info.event.title}}</b><br>Type: ${{info.event.extendedProps.type}}<br>Duration: ${{info.event.extendedProps.length}}<br>Allowance: ${{info.event.extendedProps.allowance}} days`;
-            document.body.appendChild(tooltip);
-            info.el.onmousemove = function(e) {{
-              tooltip.style.left = e.pageX + 10 + 'px';
-              tooltip.style.top = e.pageY + 10 + 'px';
-            }};
-          }}
-        }},
-        eventMouseLeave: function(info) {{
-          const tooltip = document.getElementById('tooltip');
-          if (tooltip) tooltip.remove();
-        }}
-      }});
-      calendar.render();
-    }});
-  </script>
-</head>
-<body>
-  <div id='calendar'></div>
-</body>
-</html>
-"""
-components.html(fullcalendar_html, height=950, scrolling=True)
-
-# === Auto-Refresh ===
-if refresh:
-    time.sleep(60)
-    st.experimental_rerun()
+
+# A cold start with a saved snapshot renders it right away and polls until the background check is done.
+sheet_state = None if uploaded_file else get_sheet_sync_state(GOOGLE_SHEET_NAME, WORKSHEET_NAME)
+revalidating = sheet_state is not None and sheet_state["saved_at"] is not None and (
+    sheet_state["revalidation"] is None or sheet_state["revalidation"].is_alive())
+
+# === Tracker ===
+# Runs as a fragment so auto-refresh ticks rerun only the data-dependent sections on a timer,
+# leaving the sidebar and the script thread free between ticks.
+@st.fragment(run_every=timedelta(seconds=60) if refresh else timedelta(seconds=2) if revalidating else None)
+def tracker_dashboard():
+    profiler = StageProfiler() if profile_sections else None
+    base_version = None
+    live = True
+    with profile_stage(profiler, "data load"):
+        if uploaded_file:
+            df, date_fallback = load_uploaded_trips(uploaded_file.file_id, uploaded_file)
+            data_version = ("upload", uploaded_file.file_id)
+            digest = get_trips_digest(data_version, df)
+        elif revalidating:
+            revision, snapshot = sheet_state["revision"], sheet_state["snapshot"]
+            if not revalidate_in_background(GOOGLE_SHEET_NAME, WORKSHEET_NAME, sheet_state).is_alive():
+                st.rerun()
+            st.caption(f"🕒 Showing the copy saved at {sheet_state['saved_at']} while checking the Google Sheet for changes…")
+            live = False
+        else:
+            try:
+                revision = get_sheet_revision(GOOGLE_SHEET_NAME, WORKSHEET_NAME)
+                snapshot = sync_sheet_trips(GOOGLE_SHEET_NAME, WORKSHEET_NAME, revision)
+            except Exception as e:
+                fallback = offline_trips(GOOGLE_SHEET_NAME, WORKSHEET_NAME, sheet_state)
+                if fallback is None:
+                    st.error(f"❌ Failed to load: {e}")
+                    return False
+                revision, snapshot, saved_at = fallback
+                saved = f"the copy saved at {saved_at}" if saved_at else "the last loaded copy"
+                st.warning(f"⚠️ Couldn't reach the Google Sheet ({e}); showing {saved}.")
+                live = False
+        if not uploaded_file:
+            df, date_fallback, digest = snapshot["df"], snapshot["date_fallback"], snapshot["digest"]
+            data_version = ("sheet", GOOGLE_SHEET_NAME, WORKSHEET_NAME, revision)
+            if snapshot["base_revision"] is not None:
+                base_version = ("sheet", GOOGLE_SHEET_NAME, WORKSHEET_NAME, snapshot["base_revision"])
+
+    if not date_fallback.empty:
+        report_date_fallback(date_fallback)
+
+    today = datetime.today().date()
+    memo = get_derived_memo()
+    tracker = memo.get_or_compute(("tracker", digest, today),
+                                  lambda: derive_tracker(data_version, df, today, digest, base_version, profiler))
+    if tracker["version"] != data_version:
+        # Same content under a new version: make it the base for this source's next incremental update.
+        get_tracker_store()[data_version[:-1]] = {**tracker, "version": data_version}
+    travelers = tracker["travelers"]
+    traveler = st.selectbox("🧳 Traveler", travelers) if len(travelers) > 1 else travelers[0]
+    trips = memo.get_or_compute(("trips", digest, traveler), lambda: traveler_trips(tracker, traveler, profiler))
+    view = memo.get_or_compute(("view", digest, today, traveler, restorations_shown),
+                               lambda: build_traveler_view(tracker, traveler, restorations_shown, trips, profiler))
+    df, restoration_df = view["df"], view["restoration_df"]
+
+    # === Show Tables ===
+    with profile_stage(profiler, "tables"):
+        st.subheader("📋 Trip History")
+        show_trip_history(df[['Departure', 'Return', 'Length', 'Allowance']])
+
+        st.subheader(f"📈 Next {restorations_shown} Balance Increase Dates")
+        show_table(restoration_df[['Date', 'Restored', 'New Balance']])
+
+    with profile_stage(profiler, "calendar embed"):
+        st.subheader("📅 Calendar with Daily Allowance")
+        events_source = None
+        if lazy_calendar:
+            try:
+                publish_event_chunks(view["calendar_digest"], view["calendar_events"])
+                events_source = lazy_events_source(view["calendar_digest"], *view["calendar_months"])
+            except OSError as e:
+                # Read-only or full disk: the calendar still works with every event embedded in the page.
+                calendar_logger.warning("Could not publish the calendar event chunks, embedding them inline: %s", e)
+        if events_source is None:
+            events_source = view["calendar_events_json"]
+        components.html(fullcalendar_html(events_source, fullcalendar_assets_html()), height=950, scrolling=True)
+
+    if profiler is not None:
+        report_section_timings(profiler.records, memo.stats())
+    return live
+
+if tracker_dashboard() and not uploaded_file:
+    st.sidebar.success("✅ Loaded from Google Sheet")
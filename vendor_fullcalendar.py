@@ -0,0 +1,23 @@
+"""Download the pinned FullCalendar build into ./static so the calendar works without the CDN.
+
+Run once from the repository root (with network access), then commit or ship the static folder:
+
+    python vendor_fullcalendar.py
+"""
+import os
+import urllib.request
+
+FULLCALENDAR_VERSION = "6.1.8"
+FILES = ["index.global.min.js", "LICENSE.md"]
+
+def main():
+    target = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "fullcalendar", FULLCALENDAR_VERSION)
+    os.makedirs(target, exist_ok=True)
+    for name in FILES:
+        url = f"https://cdn.jsdelivr.net/npm/fullcalendar@{FULLCALENDAR_VERSION}/{name}"
+        with urllib.request.urlopen(url) as response, open(os.path.join(target, name), "wb") as f:
+            f.write(response.read())
+        print(f"✅ {url} -> {target}")
+
+if __name__ == "__main__":
+    main()